@@ -1,10 +1,12 @@
 """
 EcoShore ML Microservice — Flask App
 --------------------------------------
-Exposes three REST endpoints:
-  POST /predict   — Run pollution risk prediction for a beach + 7-day weather
-  GET  /health    — Service health check + model status
-  POST /train     — Trigger model retraining (admin password protected)
+Exposes five REST endpoints:
+  POST /predict        — Run pollution risk prediction for a beach + 7-day weather
+  POST /predict/batch  — Same, for many beaches (rows grouped per region model)
+  GET  /health         — Service health check + model status
+  POST /train          — Trigger model retraining (admin password protected)
+  POST /models/reload  — Reload region models from disk (admin password protected)
 
 Run locally:
   python app.py
@@ -15,6 +17,7 @@ Run locally:
 import os
 import sys
 import traceback
+from datetime import datetime
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
@@ -26,6 +29,7 @@ load_dotenv()
 # Ensure predictor module (in same dir) is importable
 sys.path.insert(0, os.path.dirname(__file__))
 from predictor import predictor  # noqa: E402  module-level singleton
+from regions import DEFAULT_REGION, normalize_region_key  # noqa: E402
 
 app = Flask(__name__)
 
@@ -39,6 +43,9 @@ CORS(app, resources={r"/*": {"origins": [
 # Admin password for the /train endpoint (override via env var)
 TRAIN_SECRET = os.getenv("ML_TRAIN_SECRET", "ecoshore_train_secret")
 
+# Upper bound on beaches per /predict/batch request
+MAX_BATCH_ITEMS = int(os.getenv("ML_MAX_BATCH_ITEMS", 200))
+
 
 # ── Helpers ──────────────────────────────────────────────────────────────── #
 
@@ -50,6 +57,37 @@ def _ok(data: dict, message: str = "OK"):
     return jsonify({"success": True, "message": message, "data": data})
 
 
+def _model_used(predictions: list) -> str:
+    return predictions[0]["source"] if predictions else "rules-based"
+
+
+def _check_authorized():
+    """Return an error response unless X-Train-Secret matches, else None."""
+    secret = request.headers.get("X-Train-Secret", "")
+    if secret != TRAIN_SECRET:
+        return _err("Forbidden — invalid X-Train-Secret header", 403)
+    return None
+
+
+def _invalid_prediction_input(beach, weather, where: str = "") -> str | None:
+    """
+    Validate one beach + weather pair. Returns an error message, or None if
+    the input is usable. `where` prefixes field names (e.g. "items[3].").
+    """
+    if not isinstance(beach, dict):
+        return f"'{where}beach' must be an object"
+    if not isinstance(weather, list) or len(weather) == 0:
+        return f"'{where}weather' must be a non-empty array of daily forecast objects"
+    for i, day in enumerate(weather[:7]):
+        if not isinstance(day, dict):
+            return f"'{where}weather[{i}]' must be an object"
+        try:
+            datetime.strptime(str(day.get("date", "")), "%Y-%m-%d")
+        except ValueError:
+            return f"'{where}weather[{i}].date' must be a YYYY-MM-DD string"
+    return None
+
+
 # ── Routes ───────────────────────────────────────────────────────────────── #
 
 @app.route("/health", methods=["GET"])
@@ -64,6 +102,7 @@ def health():
         "service":      "EcoShore ML Microservice",
         "version":      "1.0.0",
         "fallbackMode": not predictor.model_loaded,
+        "regionModelsLoaded": predictor.region_models.loaded(),
     }, "Service is healthy")
 
 
@@ -82,6 +121,7 @@ def predict():
         "totalCleanups": 34,
         "location": { "city": "Colombo", ... }
       },
+      "region": "southwest",   (optional — otherwise derived from location)
       "weather": [
         {
           "date": "2026-02-21",
@@ -107,10 +147,13 @@ def predict():
             "color": "#f97316",
             "confidence": 0.85,
             "source": "random-forest",
+            "model": "southwest",
             "weatherSnapshot": { ... }
           },
           ... (7 items)
-        ]
+        ],
+        "region": "southwest",
+        ...
       }
     }
     """
@@ -120,62 +163,164 @@ def predict():
         return _err("Request body must be valid JSON")
 
     # ── Validate required keys ───────────────────────────────────────────── #
-    if not body or "beach" not in body or "weather" not in body:
+    if not isinstance(body, dict) or "beach" not in body or "weather" not in body:
         return _err("Request body must include 'beach' and 'weather' fields")
 
     beach   = body["beach"]
     weather = body["weather"]
 
-    if not isinstance(weather, list) or len(weather) == 0:
-        return _err("'weather' must be a non-empty array of daily forecast objects")
+    error = _invalid_prediction_input(beach, weather)
+    if error:
+        return _err(error)
 
     # ── Run prediction ───────────────────────────────────────────────────── #
     try:
-        predictions = predictor.predict(beach, weather)
+        result = predictor.predict_batch([
+            {"beach": beach, "weather": weather, "region": body.get("region")}
+        ])[0]
     except Exception as exc:
         traceback.print_exc()
         return _err(f"Prediction failed: {str(exc)}", 500)
 
     return _ok(
         {
-            "predictions": predictions,
+            "predictions": result["predictions"],
             "beachId":     beach.get("id"),
             "beachName":   beach.get("name"),
-            "modelUsed":   "random-forest" if predictor.model_loaded else "rules-based",
+            "region":      result["region"],
+            "modelUsed":   _model_used(result["predictions"]),
         },
         "Prediction generated successfully",
     )
 
 
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """
+    Batch pollution risk prediction.
+
+    Expected JSON body:
+    {
+      "items": [
+        { "beach": { ... }, "weather": [ ... ], "region": "east" (optional) },
+        ...
+      ]
+    }
+
+    Each item is routed to its region model; rows sharing a model are scored
+    in one call. Results are returned in the same order as "items".
+    """
+    try:
+        body = request.get_json(force=True)
+    except Exception:
+        return _err("Request body must be valid JSON")
+
+    items = body.get("items") if isinstance(body, dict) else None
+    if not isinstance(items, list) or len(items) == 0:
+        return _err("'items' must be a non-empty array of { beach, weather } objects")
+    if len(items) > MAX_BATCH_ITEMS:
+        return _err(f"'items' must contain at most {MAX_BATCH_ITEMS} entries")
+
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or "beach" not in item or "weather" not in item:
+            return _err(f"items[{i}] must include 'beach' and 'weather' fields")
+        error = _invalid_prediction_input(item["beach"], item["weather"], f"items[{i}].")
+        if error:
+            return _err(error)
+
+    try:
+        results = predictor.predict_batch(items)
+    except Exception as exc:
+        traceback.print_exc()
+        return _err(f"Prediction failed: {str(exc)}", 500)
+
+    return _ok(
+        {
+            "results": [
+                {
+                    "beachId":     item["beach"].get("id"),
+                    "beachName":   item["beach"].get("name"),
+                    "region":      result["region"],
+                    "modelUsed":   _model_used(result["predictions"]),
+                    "predictions": result["predictions"],
+                }
+                for item, result in zip(items, results)
+            ],
+        },
+        "Batch prediction generated successfully",
+    )
+
+
 @app.route("/train", methods=["POST"])
 def train():
     """
     Trigger model retraining.
     Protected by a simple shared-secret header: X-Train-Secret.
+    Pass ?refresh=true to ignore the cached feature snapshot and re-fetch data.
+    Pass ?region=<key> to train only that region's model
+    (models/regions/<key>/rf_model.pkl) instead of the global one.
 
     The train.py script is imported and run inline so Flask doesn't need
     to spawn a subprocess. For large datasets, consider running train.py
     as a background task with Celery or a simple thread.
     """
     # Simple auth guard
-    secret = request.headers.get("X-Train-Secret", "")
-    if secret != TRAIN_SECRET:
-        return _err("Forbidden — invalid X-Train-Secret header", 403)
+    denied = _check_authorized()
+    if denied:
+        return denied
 
     try:
         # Import and run training inline
         import train as train_module  # noqa: F401
-        result = train_module.run_training()
+    except Exception as exc:
+        traceback.print_exc()
+        return _err(f"Training failed: {str(exc)}", 500)
+
+    try:
+        refresh = request.args.get("refresh", "false").lower() == "true"
+        result = train_module.run_training(
+            refresh=refresh, region=request.args.get("region")
+        )
 
         # Hot-reload models into the running predictor singleton
-        predictor.reload_models()
+        if result["region"] != DEFAULT_REGION:
+            predictor.reload_region_models(result["region"])
+        else:
+            predictor.reload_models()
 
         return _ok(result, "Model training completed, models hot-reloaded")
+    except train_module.TrainingInputError as exc:
+        return _err(str(exc))
     except Exception as exc:
         traceback.print_exc()
         return _err(f"Training failed: {str(exc)}", 500)
 
 
+@app.route("/models/reload", methods=["POST"])
+def reload_models():
+    """
+    Drop cached region models so they are re-read from disk on next use —
+    e.g. after copying a new models/regions/<key>/rf_model.pkl into place.
+    The global model is left untouched. Protected by X-Train-Secret.
+    Pass ?region=<key> to reload a single region.
+    """
+    denied = _check_authorized()
+    if denied:
+        return denied
+
+    region = request.args.get("region")
+    if region is not None:
+        region = normalize_region_key(region)
+        if not region:
+            return _err("'region' must be a valid region key")
+
+    predictor.reload_region_models(region)
+    return _ok(
+        {"region": region, "regionModelsLoaded": predictor.region_models.loaded()},
+        "Region models reloaded",
+    )
+
+
 # ── Entry point ──────────────────────────────────────────────────────────── #
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+"""
+EcoShore ML Feature Definition
+------------------------------
+Single source of truth for the Random Forest feature columns.
+Imported by both predictor.py (inference) and train.py (training) so the
+two cannot drift apart.
+"""
+
+# Feature columns the Random Forest was trained on
+RF_FEATURE_COLS = [
+    "month",
+    "day_of_week",
+    "temp",
+    "humidity",
+    "wind_speed",
+    "precipitation",
+    "uv_index",
+    "severity_score",
+    "total_waste_collected",
+    "total_cleanups",
+]
+
+# Beach analytics arrive camelCase (MongoDB / Node payloads); training
+# renames them to the RF_FEATURE_COLS names before building X
+SOURCE_COLUMN_NAMES = {
+    "severityScore":       "severity_score",
+    "totalWasteCollected": "total_waste_collected",
+    "totalCleanups":       "total_cleanups",
+}
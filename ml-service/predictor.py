@@ -3,28 +3,23 @@ EcoShore ML Predictor
 ---------------------
 Encapsulates model loading and inference logic.
 Separates prediction concerns from the Flask app layer.
+
+Region-specific forests live in models/regions/<region>/rf_model.pkl and are
+loaded lazily into a bounded LRU; beaches without one use the global model.
 """
 
 import os
+import time
+import threading
 import joblib
 import numpy as np
 import pandas as pd
+from collections import OrderedDict
 from datetime import datetime
 
+from features import RF_FEATURE_COLS
+from regions import DEFAULT_REGION, resolve_region
 
-# Feature columns the Random Forest was trained on
-RF_FEATURE_COLS = [
-    "month",
-    "day_of_week",
-    "temp",
-    "humidity",
-    "wind_speed",
-    "precipitation",
-    "uv_index",
-    "severity_score",
-    "total_waste_collected",
-    "total_cleanups",
-]
 
 RISK_THRESHOLDS = {
     "LOW":      (0,  25),
@@ -52,21 +47,124 @@ def _score_to_risk(score: float) -> str:
     return "LOW"
 
 
+class _ModelCache:
+    """
+    Thread-safe LRU of lazily loaded region models.
+
+    Forests are unpickled outside the cache lock (one load per region at a
+    time), so a cold load never blocks hits on other regions. Regions with no
+    model on disk are remembered for `miss_ttl` seconds, capped at `max_misses`
+    entries, so a model dropped in later is still picked up.
+    """
+
+    def __init__(self, regions_dir: str, max_models: int,
+                 miss_ttl: float = 60.0, max_misses: int = 256):
+        self.regions_dir = regions_dir
+        self.max_models  = max(1, max_models)
+        self.miss_ttl    = miss_ttl
+        self.max_misses  = max_misses
+        self._models     = OrderedDict()
+        self._missing    = OrderedDict()   # region -> time of the failed lookup
+        self._loading    = {}              # region -> per-region load guard
+        self._generation = 0               # bumped by clear(); drops stale loads
+        self._lock       = threading.Lock()
+
+    def _cached(self, region: str) -> tuple[bool, object]:
+        """(found, model) from memory; caller must hold self._lock."""
+        if region in self._models:
+            self._models.move_to_end(region)
+            return True, self._models[region]
+        missed_at = self._missing.get(region)
+        if missed_at is not None:
+            if time.monotonic() - missed_at < self.miss_ttl:
+                return True, None
+            del self._missing[region]
+        return False, None
+
+    def _load(self, region: str):
+        path = os.path.join(self.regions_dir, region, "rf_model.pkl")
+        if not os.path.exists(path):
+            return None
+        try:
+            model = joblib.load(path)
+        except Exception as exc:
+            print(f"[Predictor] Failed to load region model '{region}': {exc}")
+            return None
+        print(f"[Predictor] Loaded region model '{region}'.")
+        return model
+
+    def get(self, region: str):
+        """Return the model for `region`, loading it on first use, or None."""
+        with self._lock:
+            found, model = self._cached(region)
+            if found:
+                return model
+            guard = self._loading.setdefault(region, threading.Lock())
+
+        with guard:
+            with self._lock:
+                # Another thread may have finished loading while we waited
+                found, model = self._cached(region)
+                if found:
+                    return model
+                generation = self._generation
+
+            model = self._load(region)
+
+            with self._lock:
+                if self._loading.get(region) is guard:
+                    del self._loading[region]
+                if generation != self._generation:
+                    return model
+                if model is None:
+                    self._missing[region] = time.monotonic()
+                    while len(self._missing) > self.max_misses:
+                        self._missing.popitem(last=False)
+                    return None
+                self._models[region] = model
+                while len(self._models) > self.max_models:
+                    evicted, _ = self._models.popitem(last=False)
+                    print(f"[Predictor] Evicted region model '{evicted}'.")
+                return model
+
+    def loaded(self) -> list:
+        with self._lock:
+            return list(self._models)
+
+    def clear(self, region: str | None = None):
+        """Forget one region (or all), so its next request reloads from disk."""
+        with self._lock:
+            self._generation += 1
+            if region is None:
+                self._models.clear()
+                self._missing.clear()
+            else:
+                self._models.pop(region, None)
+                self._missing.pop(region, None)
+
+
 class Predictor:
     """
     Loads pre-trained Random Forest and Prophet models from disk and
     produces pollution risk predictions for a given beach + 7-day weather.
-    Falls back to a rules-based calculation if models are not yet trained.
+    Region models are routed per beach (see resolve_region) and fall back
+    to the global model, then to a rules-based calculation if none is trained.
     """
 
     MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
     RF_PATH    = os.path.join(MODEL_DIR, "rf_model.pkl")
     PROP_PATH  = os.path.join(MODEL_DIR, "prophet_model.pkl")
+    REGIONS_DIR = os.path.join(MODEL_DIR, "regions")
+    MAX_REGION_MODELS = int(os.getenv("ML_MAX_REGION_MODELS", 4))
+    REGION_MISS_TTL = float(os.getenv("ML_REGION_MISS_TTL", 60))
 
     def __init__(self):
         self.rf_model     = None
         self.prophet_model = None
         self.model_loaded = False
+        self.region_models = _ModelCache(
+            self.REGIONS_DIR, self.MAX_REGION_MODELS, miss_ttl=self.REGION_MISS_TTL
+        )
         self._try_load_models()
 
     # ------------------------------------------------------------------ #
@@ -91,6 +189,25 @@ class Predictor:
     def reload_models(self):
         """Hot-reload models after re-training without restarting Flask."""
         self._try_load_models()
+        self.reload_region_models()
+
+    def reload_region_models(self, region: str | None = None):
+        """
+        Drop one region model (or all) from memory without touching the
+        global model; it is reloaded from disk on its next request.
+        """
+        self.region_models.clear(region)
+
+    def _model_for(self, region: str) -> tuple[str, object]:
+        """
+        Return (model_key, model) for a region: the region's own forest if
+        one exists, else the global forest (None when untrained).
+        """
+        if region != DEFAULT_REGION:
+            model = self.region_models.get(region)
+            if model is not None:
+                return region, model
+        return DEFAULT_REGION, self.rf_model
 
     # ------------------------------------------------------------------ #
     # Feature engineering
@@ -99,21 +216,22 @@ class Predictor:
     def _build_features(self, beach: dict, day: dict, date_str: str) -> np.ndarray:
         """
         Convert raw beach + single-day weather into an ML feature row.
-        Must match the column order used during training (RF_FEATURE_COLS).
+        Values are keyed by name and ordered by RF_FEATURE_COLS (features.py).
         """
         dt = datetime.strptime(date_str, "%Y-%m-%d")
-        return np.array([[
-            dt.month,
-            dt.weekday(),
-            float(day.get("temp", 28)),
-            float(day.get("humidity", 75)),
-            float(day.get("windSpeed", 4)),
-            float(day.get("precipitation", 0)),
-            float(day.get("uvIndex", 8)),
-            float(beach.get("severityScore", 30)),
-            float(beach.get("totalWasteCollected", 0)),
-            float(beach.get("totalCleanups", 0)),
-        ]])
+        values = {
+            "month":                 dt.month,
+            "day_of_week":           dt.weekday(),
+            "temp":                  float(day.get("temp", 28)),
+            "humidity":              float(day.get("humidity", 75)),
+            "wind_speed":            float(day.get("windSpeed", 4)),
+            "precipitation":         float(day.get("precipitation", 0)),
+            "uv_index":              float(day.get("uvIndex", 8)),
+            "severity_score":        float(beach.get("severityScore", 30)),
+            "total_waste_collected": float(beach.get("totalWasteCollected", 0)),
+            "total_cleanups":        float(beach.get("totalCleanups", 0)),
+        }
+        return np.array([[values[col] for col in RF_FEATURE_COLS]])
 
     # ------------------------------------------------------------------ #
     # Fallback (no trained model)
@@ -138,65 +256,116 @@ class Predictor:
     # Ensemble inference
     # ------------------------------------------------------------------ #
 
-    def _ml_score(self, beach: dict, day: dict, date_str: str) -> tuple[float, float]:
+    def _ml_scores(self, model, features: np.ndarray) -> tuple[np.ndarray, float]:
         """
-        Random Forest prediction (primary).
-        Returns (score, confidence).
+        Random Forest prediction (primary) for a stacked feature matrix.
+        Returns (scores, confidence).
         """
-        features = self._build_features(beach, day, date_str)
-        rf_score = float(self.rf_model.predict(features)[0])
-        rf_score = max(0, min(100, rf_score))
-        return rf_score, 0.85
+        scores = np.clip(model.predict(features), 0, 100)
+        return scores, 0.85
 
     # ------------------------------------------------------------------ #
     # Public API
     # ------------------------------------------------------------------ #
 
-    def predict(self, beach: dict, weather_7day: list) -> list:
+    def predict(self, beach: dict, weather_7day: list, region: str | None = None) -> list:
         """
         Produce a 7-element list of daily pollution risk predictions.
 
         Args:
             beach       — dict with keys: severityScore, totalWasteCollected,
-                          totalCleanups, name, id
+                          totalCleanups, name, id, optional region / location
             weather_7day — list of 7 dicts each with: date, temp, humidity,
                           windSpeed, precipitation, uvIndex
+            region      — optional explicit model key (overrides beach data)
 
         Returns:
-            list of dicts: { date, riskScore, riskLevel, color, confidence, source }
+            list of dicts: { date, riskScore, riskLevel, color, confidence, source, model }
         """
-        results = []
+        item = {"beach": beach, "weather": weather_7day, "region": region}
+        return self.predict_batch([item])[0]["predictions"]
+
+    def predict_batch(self, items: list) -> list:
+        """
+        Predict for many beaches at once. Rows are grouped by the model
+        they route to, and each group is scored with a single predict() call.
 
-        for i, day in enumerate(weather_7day[:7]):
-            date_str = day.get("date", "")
+        Args:
+            items — list of dicts: { beach, weather, region (optional) }
 
-            if self.model_loaded:
-                score, confidence = self._ml_score(beach, day, date_str)
-                source = "random-forest"
+        Returns:
+            list of dicts, in input order: { region, model, predictions }
+        """
+        regions = [
+            resolve_region(item.get("beach") or {}, item.get("region")) for item in items
+        ]
+        # Resolve each distinct region once and hold the references for the
+        # whole call, so LRU eviction mid-batch never triggers a reload
+        routes = {region: self._model_for(region) for region in dict.fromkeys(regions)}
+
+        # model_key -> (model, [(item_idx, day_idx, feature_row)])
+        groups = {}
+        resolved = []
+
+        for idx, item in enumerate(items):
+            beach = item.get("beach") or {}
+            region = regions[idx]
+            model_key, model = routes[region]
+            resolved.append((region, model_key))
+
+            _, rows = groups.setdefault(model_key, (model, []))
+            for i, day in enumerate((item.get("weather") or [])[:7]):
+                features = None
+                if model is not None:
+                    features = self._build_features(beach, day, day.get("date", ""))
+                rows.append((idx, i, features))
+
+        # (item_idx, day_idx) -> (score, confidence, source)
+        scored = {}
+        for model_key, (model, rows) in groups.items():
+            if not rows:
+                continue
+            if model is not None:
+                scores, confidence = self._ml_scores(model, np.vstack([r[2] for r in rows]))
+                for (idx, i, _), score in zip(rows, scores):
+                    scored[(idx, i)] = (float(score), confidence, "random-forest")
             else:
-                score, confidence = self._rules_based_score(beach, day)
-                source = "rules-based"
-
-            # Confidence decays slightly for later days (less reliable forecast)
-            decay = 0.03 * i
-            confidence = round(max(0.50, confidence - decay), 2)
-
-            risk_level = _score_to_risk(score)
-
-            results.append({
-                "date":        date_str,
-                "riskScore":   round(score, 2),
-                "riskLevel":   risk_level,
-                "color":       RISK_COLORS[risk_level],
-                "confidence":  confidence,
-                "source":      source,
-                "weatherSnapshot": {
-                    "temp":          day.get("temp"),
-                    "humidity":      day.get("humidity"),
-                    "precipitation": day.get("precipitation"),
-                    "windSpeed":     day.get("windSpeed"),
-                },
-            })
+                for idx, i, _ in rows:
+                    day = items[idx]["weather"][i]
+                    score, confidence = self._rules_based_score(items[idx].get("beach") or {}, day)
+                    scored[(idx, i)] = (score, confidence, "rules-based")
+
+        results = []
+        for idx, item in enumerate(items):
+            region, model_key = resolved[idx]
+            predictions = []
+
+            for i, day in enumerate((item.get("weather") or [])[:7]):
+                score, confidence, source = scored[(idx, i)]
+
+                # Confidence decays slightly for later days (less reliable forecast)
+                decay = 0.03 * i
+                confidence = round(max(0.50, confidence - decay), 2)
+
+                risk_level = _score_to_risk(score)
+
+                predictions.append({
+                    "date":        day.get("date", ""),
+                    "riskScore":   round(score, 2),
+                    "riskLevel":   risk_level,
+                    "color":       RISK_COLORS[risk_level],
+                    "confidence":  confidence,
+                    "source":      source,
+                    "model":       model_key,
+                    "weatherSnapshot": {
+                        "temp":          day.get("temp"),
+                        "humidity":      day.get("humidity"),
+                        "precipitation": day.get("precipitation"),
+                        "windSpeed":     day.get("windSpeed"),
+                    },
+                })
+
+            results.append({"region": region, "model": model_key, "predictions": predictions})
 
         return results
 
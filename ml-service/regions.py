@@ -0,0 +1,106 @@
+"""
+EcoShore ML Regions
+-------------------
+Maps a beach to the region whose model should score it.
+Shared by predictor.py (routing) and train.py (per-region training).
+"""
+
+import re
+
+
+DEFAULT_REGION = "default"
+
+# Sri Lanka's coasts follow opposite monsoons: the southwest monsoon (May–Sep)
+# hits the west/south coast, the northeast monsoon (Oct–Jan) the north and east.
+CITY_REGIONS = {
+    "colombo":        "southwest",
+    "mount lavinia":  "southwest",
+    "negombo":        "southwest",
+    "kalutara":       "southwest",
+    "beruwala":       "southwest",
+    "bentota":        "southwest",
+    "hikkaduwa":      "southwest",
+    "galle":          "southwest",
+    "unawatuna":      "southwest",
+    "mirissa":        "southwest",
+    "matara":         "southwest",
+    "tangalle":       "southwest",
+    "trincomalee":    "east",
+    "nilaveli":       "east",
+    "batticaloa":     "east",
+    "pasikudah":      "east",
+    "kalkudah":       "east",
+    "arugam bay":     "east",
+    "pottuvil":       "east",
+    "jaffna":         "north",
+    "point pedro":    "north",
+    "kankesanthurai": "north",
+}
+
+# Coordinates outside this box are not Sri Lankan beaches → default model
+SL_LON_RANGE = (79.4, 82.0)
+SL_LAT_RANGE = (5.8, 10.0)
+
+# Used when the city is unknown: north of NORTH_MIN_LAT is the north coast;
+# east of EAST_COAST_MIN_LON (and north of the southern tip) the east coast
+NORTH_MIN_LAT = 9.0
+EAST_COAST_MIN_LON = 81.0
+EAST_COAST_MIN_LAT = 6.5
+
+# Region keys double as directory names, so keep them filesystem-safe
+_REGION_KEY_RE = re.compile(r"^[a-z0-9_-]{1,64}$")
+
+
+def normalize_region_key(key) -> str | None:
+    """Lower-case a region key; returns None if it is not filesystem-safe."""
+    key = str(key).strip().lower()
+    return key if _REGION_KEY_RE.match(key) else None
+
+
+def region_from_location(city=None, coords=None) -> str:
+    """
+    Region for a city name and/or GeoJSON [longitude, latitude] pair.
+    Returns DEFAULT_REGION if neither is usable.
+    """
+    city = str(city or "").strip().lower()
+    if city in CITY_REGIONS:
+        return CITY_REGIONS[city]
+
+    if not isinstance(coords, (list, tuple)) or len(coords) != 2:
+        return DEFAULT_REGION
+    try:
+        lon, lat = float(coords[0]), float(coords[1])
+    except (TypeError, ValueError):
+        return DEFAULT_REGION
+
+    if not (SL_LON_RANGE[0] <= lon <= SL_LON_RANGE[1]
+            and SL_LAT_RANGE[0] <= lat <= SL_LAT_RANGE[1]):
+        return DEFAULT_REGION
+    if lat >= NORTH_MIN_LAT:
+        return "north"
+    if lon >= EAST_COAST_MIN_LON and lat >= EAST_COAST_MIN_LAT:
+        return "east"
+    return "southwest"
+
+
+def resolve_region(beach: dict, explicit: str | None = None) -> str:
+    """
+    Pick the model region for a beach: an explicit key wins, then
+    beach.region, then location.city, then location coordinates.
+    Returns DEFAULT_REGION if nothing usable is found; malformed input
+    never raises, so routing cannot fail a prediction.
+    """
+    key = explicit or beach.get("region")
+    if key:
+        return normalize_region_key(key) or DEFAULT_REGION
+
+    location = beach.get("location")
+    if not isinstance(location, dict):
+        return DEFAULT_REGION
+
+    # Beach schema stores GeoJSON { type, coordinates: [longitude, latitude] };
+    # a bare [longitude, latitude] pair is accepted too
+    coords = location.get("coordinates")
+    if isinstance(coords, dict):
+        coords = coords.get("coordinates")
+    return region_from_location(location.get("city"), coords)
@@ -5,11 +5,15 @@ Trains a Random Forest regressor on historical beach pollution data.
 Optionally refines predictions using Prophet for time-series trends.
 
 Usage:
-  python train.py
+  python train.py                 # reuse the feature snapshot if the data is unchanged
+  python train.py --refresh       # force a fresh fetch + featurization
+  python train.py --region east   # train only beaches routed to one region
 
 Output:
-  models/rf_model.pkl      — Trained Random Forest model
-  models/prophet_model.pkl — Trained Prophet model (time-series trend)
+  models/rf_model.pkl                   — Trained Random Forest model
+  models/prophet_model.pkl              — Trained Prophet model (time-series trend)
+  models/regions/<region>/rf_model.pkl  — Region Random Forest (--region)
+  models/snapshots/<key>/               — Cached X/y matrices (memory-mappable .npy files)
 
 Requirements:
   - MONGO_URI env var (same MongoDB Atlas used by the Node backend)
@@ -19,6 +23,9 @@ Requirements:
 
 import os
 import json
+import argparse
+import shutil
+import hashlib
 import joblib
 import warnings
 import numpy as np
@@ -27,12 +34,35 @@ import pandas as pd
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+from features import RF_FEATURE_COLS, SOURCE_COLUMN_NAMES
+from regions import DEFAULT_REGION, normalize_region_key, region_from_location
+
 warnings.filterwarnings("ignore")  # Suppress Prophet verbose output
 
 # ── Load environment ─────────────────────────────────────────────────────── #
 load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI", "")
 MODELS_DIR = os.path.join(os.path.dirname(__file__), "models")
+SNAPSHOT_DIR = os.path.join(MODELS_DIR, "snapshots")
+REGIONS_DIR = os.path.join(MODELS_DIR, "regions")
+MIN_REGION_SAMPLES = 50
+SNAPSHOT_KEEP = int(os.getenv("ML_SNAPSHOT_KEEP", 5))
+
+# Snapshots are keyed on RF_FEATURE_COLS (features.py). Bump FEATURE_VERSION
+# whenever _build_features or the snapshot layout changes in a way the column
+# list alone does not capture — it invalidates every cached snapshot.
+# Region labels are not part of the key: snapshots store each record's raw
+# city and coordinates, and regions.py rules are re-applied on every load.
+FEATURE_VERSION = 3
+SYNTHETIC_SAMPLES = 500
+SYNTHETIC_FINGERPRINT = {"source": "synthetic", "samples": SYNTHETIC_SAMPLES, "seed": 42}
+
+
+class TrainingInputError(ValueError):
+    """
+    The training request itself is unusable (bad region key, too few
+    samples). app.py maps this to a 400; any other error is a real failure.
+    """
 
 
 # ── Data helpers ─────────────────────────────────────────────────────────── #
@@ -71,6 +101,8 @@ def _fetch_from_mongo() -> pd.DataFrame:
                 "severityScore":      "$beach.analytics.severityScore",
                 "totalWasteCollected":"$beach.analytics.totalWasteCollected",
                 "totalCleanups":      "$beach.analytics.totalCleanups",
+                "city":               "$beach.location.city",
+                "coordinates":        "$beach.location.coordinates.coordinates",
             }
         },
     ]
@@ -88,7 +120,7 @@ def _fetch_from_mongo() -> pd.DataFrame:
     return df
 
 
-def _generate_synthetic_data(n_samples: int = 500) -> pd.DataFrame:
+def _generate_synthetic_data(n_samples: int = SYNTHETIC_SAMPLES) -> pd.DataFrame:
     """
     Generate synthetic training data when MongoDB records are insufficient.
     Models realistic Sri Lanka beach pollution patterns:
@@ -140,14 +172,50 @@ def _generate_synthetic_data(n_samples: int = 500) -> pd.DataFrame:
     return pd.DataFrame(rows)
 
 
+def _location_arrays(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Each record's beach city and GeoJSON longitude/latitude as flat arrays
+    ("" / NaN where missing). Synthetic rows carry no location.
+    """
+    n = len(df)
+    cities = df["city"] if "city" in df.columns else [None] * n
+    city = np.array([c if isinstance(c, str) else "" for c in cities], dtype=str)
+
+    lon = np.full(n, np.nan)
+    lat = np.full(n, np.nan)
+    if "coordinates" in df.columns:
+        for i, xy in enumerate(df["coordinates"]):
+            if isinstance(xy, (list, tuple)) and len(xy) == 2:
+                try:
+                    lon[i], lat[i] = float(xy[0]), float(xy[1])
+                except (TypeError, ValueError):
+                    pass
+    return city, lon, lat
+
+
+def _assign_regions(city: np.ndarray, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """
+    Route each record to a model region with the same rules predictor.py
+    uses at inference. Records without a location → DEFAULT_REGION.
+    """
+    return np.array(
+        [
+            region_from_location(c, None if np.isnan(x) or np.isnan(y) else [x, y])
+            for c, x, y in zip(city, lon, lat)
+        ],
+        dtype=str,
+    )
+
+
 # ── Feature engineering ───────────────────────────────────────────────────── #
 
 def _build_features(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
     """
     Build the feature matrix X and target vector y.
-    NOTE: Column order must match RF_FEATURE_COLS in predictor.py exactly.
+    Columns are taken in RF_FEATURE_COLS order (features.py), the same
+    list predictor.py builds its inference rows against.
     """
-    df = df.copy()
+    df = df.rename(columns=SOURCE_COLUMN_NAMES)
     df["month"]       = df["date"].dt.month
     df["day_of_week"] = df["date"].dt.dayofweek
 
@@ -159,13 +227,8 @@ def _build_features(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
         if col not in df.columns:
             df[col] = default
 
-    feature_cols = [
-        "month", "day_of_week", "temp", "humidity", "wind_speed",
-        "precipitation", "uv_index",
-        "severityScore", "totalWasteCollected", "totalCleanups",
-    ]
     # Fill any remaining NaNs with column medians
-    df[feature_cols] = df[feature_cols].fillna(df[feature_cols].median())
+    df[RF_FEATURE_COLS] = df[RF_FEATURE_COLS].fillna(df[RF_FEATURE_COLS].median())
 
     # Target: use explicit target_score if synthetic, else use weight as proxy
     if "target_score" in df.columns:
@@ -175,10 +238,195 @@ def _build_features(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
         max_w = df["weight"].max() or 1
         y = np.clip((df["weight"] / max_w) * 100, 0, 100).values
 
-    X = df[feature_cols].values
+    X = df[RF_FEATURE_COLS].values
     return X, y
 
 
+# ── Dataset snapshots ────────────────────────────────────────────────────── #
+
+def _source_fingerprint() -> dict:
+    """
+    Cheap description of the current training source, used to key snapshots.
+    Counts + latest updatedAt of verified waste records and beaches change
+    whenever anything the $lookup join reads changes, without running it.
+    Returns SYNTHETIC_FINGERPRINT when training would use synthetic data
+    anyway, or None if MongoDB could not be fingerprinted — the caller then
+    skips the snapshot rather than guessing at the source.
+    """
+    if not MONGO_URI:
+        return SYNTHETIC_FINGERPRINT
+
+    from pymongo import MongoClient
+
+    def _stats(collection, match: dict) -> dict:
+        latest = collection.find_one(match, {"updatedAt": 1}, sort=[("updatedAt", -1)])
+        updated = latest.get("updatedAt") if latest else None
+        if hasattr(updated, "isoformat"):
+            updated = updated.isoformat()
+        return {
+            "count":     collection.count_documents(match),
+            "updatedAt": None if updated is None else str(updated),
+        }
+
+    try:
+        client = MongoClient(MONGO_URI)
+        db = client.get_default_database()
+        waste = _stats(db.wasterecords, {"isVerified": True})
+        beaches = _stats(db.beaches, {})
+        client.close()
+    except Exception as e:
+        print(f"[Train] Could not fingerprint MongoDB ({e}) — skipping feature snapshot.")
+        return None
+
+    # _fetch_from_mongo() falls back to synthetic data when nothing is verified
+    if waste["count"] == 0:
+        return SYNTHETIC_FINGERPRINT
+    return {"source": "mongo", "wasterecords": waste, "beaches": beaches}
+
+
+def _snapshot_key(fingerprint: dict) -> str:
+    """Hash of the source fingerprint and the feature definition."""
+    payload = json.dumps(
+        {
+            "source":   fingerprint,
+            "features": RF_FEATURE_COLS,
+            "version":  FEATURE_VERSION,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _save_snapshot(key: str, fingerprint: dict, df: pd.DataFrame,
+                   X: np.ndarray, y: np.ndarray) -> str:
+    """
+    Persist X, y, each row's raw location (city, lon, lat) and the
+    (date, weight) series Prophet needs as .npy files.
+    Written to a temp dir and renamed so a crash never leaves a half snapshot.
+    """
+    path = os.path.join(SNAPSHOT_DIR, key)
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, "X.npy"), np.ascontiguousarray(X, dtype=np.float64))
+    np.save(os.path.join(tmp_path, "y.npy"), np.ascontiguousarray(y, dtype=np.float64))
+    np.save(os.path.join(tmp_path, "date.npy"), df["date"].values.astype("datetime64[ns]"))
+    np.save(os.path.join(tmp_path, "weight.npy"), df["weight"].values.astype(np.float64))
+    city, lon, lat = _location_arrays(df)
+    np.save(os.path.join(tmp_path, "city.npy"), city)
+    np.save(os.path.join(tmp_path, "lon.npy"), lon)
+    np.save(os.path.join(tmp_path, "lat.npy"), lat)
+
+    meta = {
+        "key":            key,
+        "createdAt":      datetime.utcnow().isoformat() + "Z",
+        "featureCols":    RF_FEATURE_COLS,
+        "featureVersion": FEATURE_VERSION,
+        "source":         fingerprint,
+        "sampleCount":    int(X.shape[0]),
+    }
+    with open(os.path.join(tmp_path, "meta.json"), "w") as fh:
+        json.dump(meta, fh, indent=2)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _load_snapshot(key: str):
+    """
+    Memory-map a snapshot's matrices. Returns (X, y, df) or None if the
+    snapshot is missing or unreadable. `df` only holds date, weight and a
+    region column derived from the stored location with the current rules.
+    """
+    path = os.path.join(SNAPSHOT_DIR, key)
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    try:
+        X = np.load(os.path.join(path, "X.npy"), mmap_mode="r")
+        y = np.load(os.path.join(path, "y.npy"), mmap_mode="r")
+        df = pd.DataFrame({
+            "date":   pd.to_datetime(np.load(os.path.join(path, "date.npy"))),
+            "weight": np.load(os.path.join(path, "weight.npy")),
+            "region": _assign_regions(
+                np.load(os.path.join(path, "city.npy")),
+                np.load(os.path.join(path, "lon.npy")),
+                np.load(os.path.join(path, "lat.npy")),
+            ),
+        })
+    except Exception as e:
+        print(f"[Train] Snapshot {key} unreadable ({e}) — rebuilding.")
+        return None
+    # Touch so pruning treats it as recently used
+    os.utime(os.path.join(path, "meta.json"))
+    return X, y, df
+
+
+def _prune_snapshots(keep: int = SNAPSHOT_KEEP):
+    """Delete all but the `keep` most recently used snapshots."""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return
+    snapshots = []
+    for name in os.listdir(SNAPSHOT_DIR):
+        meta_path = os.path.join(SNAPSHOT_DIR, name, "meta.json")
+        if os.path.exists(meta_path):
+            snapshots.append((os.path.getmtime(meta_path), name))
+    for _, name in sorted(snapshots, reverse=True)[keep:]:
+        shutil.rmtree(os.path.join(SNAPSHOT_DIR, name), ignore_errors=True)
+
+
+def load_training_data(refresh: bool = False) -> tuple[np.ndarray, np.ndarray, pd.DataFrame, dict]:
+    """
+    Return (X, y, df, info) for training, reusing a cached snapshot when the
+    source data and feature definition are unchanged.
+
+    Hyperparameter experiments should call this instead of fetching directly:
+      X, y, _, _ = load_training_data()
+
+    X and y are read-only memory maps when served from a snapshot.
+    `df` is the raw frame on a rebuild, or just date, weight and region on
+    a cache hit; both carry a "region" column.
+    Pass refresh=True to ignore any existing snapshot and rebuild it.
+    """
+    fingerprint = _source_fingerprint()
+    key = _snapshot_key(fingerprint) if fingerprint is not None else None
+
+    if key and not refresh:
+        cached = _load_snapshot(key)
+        if cached is not None:
+            X, y, df = cached
+            print(f"[Train] Loaded feature snapshot {key} ({X.shape[0]} samples).")
+            return X, y, df, {"key": key, "cached": True}
+
+    # Fetch or generate data (an unknown fingerprint still tries MongoDB)
+    if fingerprint is None or fingerprint["source"] == "mongo":
+        try:
+            df = _fetch_from_mongo()
+        except Exception as e:
+            print(f"[Train] MongoDB fetch failed ({e}) — using synthetic data.")
+            df = _generate_synthetic_data()
+            fingerprint = SYNTHETIC_FINGERPRINT
+            key = _snapshot_key(fingerprint)
+    else:
+        df = _generate_synthetic_data()
+
+    df["region"] = _assign_regions(*_location_arrays(df))
+    X, y = _build_features(df)
+
+    if key is None:
+        return X, y, df, {"key": None, "cached": False}
+
+    try:
+        path = _save_snapshot(key, fingerprint, df, X, y)
+        print(f"[Train] Saved feature snapshot → {path}")
+        _prune_snapshots()
+    except OSError as e:
+        print(f"[Train] Could not save feature snapshot ({e}) — continuing.")
+
+    return X, y, df, {"key": key, "cached": False}
+
+
 # ── Training functions ────────────────────────────────────────────────────── #
 
 def _train_random_forest(X: np.ndarray, y: np.ndarray):
@@ -249,31 +497,54 @@ def _train_prophet(df: pd.DataFrame):
 
 # ── Entry point ──────────────────────────────────────────────────────────── #
 
-def run_training() -> dict:
+def run_training(refresh: bool = False, region: str | None = None) -> dict:
     """
     Main training pipeline. Returns a summary dict consumed by app.py /train.
+    Set refresh=True to bypass the feature snapshot and re-fetch the data.
+    Set region to train only that region's records into
+    models/regions/<region>/rf_model.pkl (Prophet stays global-only).
+    Raises TrainingInputError for an invalid region key or one with fewer
+    than MIN_REGION_SAMPLES records.
     """
-    os.makedirs(MODELS_DIR, exist_ok=True)
+    if region is not None:
+        key = normalize_region_key(region)
+        if not key or key == DEFAULT_REGION:
+            raise TrainingInputError(
+                "'region' must be a region key such as 'southwest' or 'east'"
+            )
+        region = key
 
-    # 1. Fetch or generate data
-    try:
-        df = _fetch_from_mongo()
-    except Exception as e:
-        print(f"[Train] MongoDB fetch failed ({e}) — using synthetic data.")
-        df = _generate_synthetic_data()
+    os.makedirs(MODELS_DIR, exist_ok=True)
 
-    # 2. Build features
-    X, y = _build_features(df)
+    # 1–2. Fetch data and build features (or load the cached snapshot)
+    X, y, df, snapshot = load_training_data(refresh=refresh)
+
+    if region:
+        mask = df["region"].values == region
+        X, y = X[mask], y[mask]
+        df = df.loc[mask].reset_index(drop=True)
+        if X.shape[0] < MIN_REGION_SAMPLES:
+            raise TrainingInputError(
+                f"Region '{region}' has {X.shape[0]} training samples "
+                f"(need at least {MIN_REGION_SAMPLES})"
+            )
     print(f"[Train] Feature matrix: {X.shape[0]} samples × {X.shape[1]} features")
 
     # 3. Train Random Forest
     rf_model, rf_metrics = _train_random_forest(X, y)
-    rf_path = os.path.join(MODELS_DIR, "rf_model.pkl")
-    joblib.dump(rf_model, rf_path)
+    if region:
+        rf_path = os.path.join(REGIONS_DIR, region, "rf_model.pkl")
+        os.makedirs(os.path.dirname(rf_path), exist_ok=True)
+        # Write then rename: the running service may load this file at any time
+        joblib.dump(rf_model, f"{rf_path}.tmp")
+        os.replace(f"{rf_path}.tmp", rf_path)
+    else:
+        rf_path = os.path.join(MODELS_DIR, "rf_model.pkl")
+        joblib.dump(rf_model, rf_path)
     print(f"[Train] Saved RF model → {rf_path}")
 
     # 4. Train Prophet
-    prophet_model, prophet_metrics = _train_prophet(df)
+    prophet_model, prophet_metrics = (None, {}) if region else _train_prophet(df)
     if prophet_model is not None:
         prophet_path = os.path.join(MODELS_DIR, "prophet_model.pkl")
         joblib.dump(prophet_model, prophet_path)
@@ -281,7 +552,9 @@ def run_training() -> dict:
 
     summary = {
         "trainedAt":     datetime.utcnow().isoformat() + "Z",
+        "region":        region or DEFAULT_REGION,
         "sampleCount":   int(X.shape[0]),
+        "snapshot":      snapshot,
         "randomForest":  rf_metrics,
         "prophet":       prophet_metrics,
         "modelsDir":     MODELS_DIR,
@@ -291,4 +564,10 @@ def run_training() -> dict:
 
 
 if __name__ == "__main__":
-    run_training()
+    parser = argparse.ArgumentParser(description="Train EcoShore pollution models.")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ignore the cached feature snapshot and re-fetch data")
+    parser.add_argument("--region",
+                        help="train only this region's model, e.g. southwest or east")
+    args = parser.parse_args()
+    run_training(refresh=args.refresh, region=args.region)